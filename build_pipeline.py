@@ -1,6 +1,13 @@
-from azure.ai.ml import command
+import hashlib
+import os
+from fnmatch import fnmatch
+from functools import lru_cache
+from pathlib import Path
+
+from azure.ai.ml import MLClient, command
 from azure.ai.ml.dsl import pipeline
-from azure.ai.ml.entities import Environment, BuildContext
+from azure.ai.ml.entities import BuildContext, Environment
+from azure.core.exceptions import ResourceNotFoundError
 
 from core import DataSchema
 from core.build_ import Env, build_infofile
@@ -13,97 +20,186 @@ PIPELINE_NAME = "AML-SDK2-Template"
 DESCRIPTION = "basic pipeline example on azure ml sdk v2"
 EXPERIMENT_NAME = "DebugTestSDK2DockerUV"
 
-# 1. Auth, feel free yourself to using your auth method
-client = get_ml_client()
 
+def _read_dockerignore(context_dir: Path) -> list:
+    """Returns patterns from `.dockerignore` of the build context, `.git` is always ignored."""
+    patterns = [".git"]
+    dockerignore = context_dir / ".dockerignore"
+    if dockerignore.exists():
+        for line in dockerignore.read_text().splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                patterns.append(line.strip("/"))
+    # `**/` as in docker means zero or more dirs
+    return [*patterns, *(p[3:] for p in patterns if p.startswith("**/"))]
 
-# 2. DEFINE ENV
-build_context = BuildContext(
-    path=".",
-    dockerfile_path="./amlenv.Dockerfile")
 
-env = Environment(
-    name='test_'+ ENV_NAME + "_docker",
-    build=build_context,
-    description="test docker based env",
-)
-env = client.environments.create_or_update(env)
+def _is_ignored(rel_path: str, patterns: list) -> bool:
+    return any(fnmatch(rel_path, p) or fnmatch(rel_path, f"{p}/*") for p in patterns)
+
+
+def _iter_context_files(context_dir: Path, patterns: list):
+    """Walks build context and yields (relative posix path, abs path) of not ignored files."""
+    stack = [context_dir]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            entries = list(it)
+        for e in entries:
+            rel_path = Path(e.path).relative_to(context_dir).as_posix()
+            if _is_ignored(rel_path, patterns):
+                continue
+            if e.is_dir(follow_symlinks=False):
+                stack.append(Path(e.path))
+            elif e.is_file():
+                yield rel_path, e.path
+
+
+def hash_build_context(dockerfile: str, context_dir: str = ".") -> str:
+    """Returns sha256 over the dockerfile(path relative to `context_dir`) and all files of the build context."""
+    context_dir = Path(context_dir).resolve()
+    dockerfile_bytes = (context_dir / dockerfile).read_bytes()
+    # each entry is framed by its name and size, so file boundaries can't shift between files
+    digest = hashlib.sha256(f"{len(dockerfile_bytes)}\0".encode())
+    digest.update(dockerfile_bytes)
+    for rel_path, path in sorted(_iter_context_files(context_dir, _read_dockerignore(context_dir))):
+        digest.update(f"{rel_path}\0{os.path.getsize(path)}\0".encode())
+        with open(path, "rb") as f:
+            while chunk := f.read(1 << 20):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def ensure_env(client: MLClient, name: str, dockerfile: str, context_dir: str = ".") -> Environment:
+    """Returns docker based env versioned by hash of its build context, builds it only if it doesn't exist yet."""
+    version = hash_build_context(dockerfile, context_dir)
+    try:
+        return client.environments.get(name=name, version=version)
+    except ResourceNotFoundError:
+        env = Environment(
+            name=name,
+            version=version,
+            build=BuildContext(path=context_dir, dockerfile_path=dockerfile),
+            description="test docker based env",
+        )
+        return client.environments.create_or_update(env)
+
+
+# 1. Auth, feel free yourself to using your auth method
+@lru_cache(maxsize=None)
+def get_client() -> MLClient:
+    return get_ml_client()
+
+
+# 2. DEFINE ENV - rebuilt only when Dockerfile or build context changed
+@lru_cache(maxsize=None)
+def get_env() -> Environment:
+    return ensure_env(
+        get_client(), name="test_" + ENV_NAME + "_docker", dockerfile="./amlenv.Dockerfile", context_dir="."
+    )
 
 
 # 3. Define DataSchema's
-laptops = DataSchema(default_value="teststorage:test_datasets/toy datasets/laptop_price.csv", data_type="uri_file")
+@lru_cache(maxsize=None)
+def get_data_schemas() -> tuple:
+    """Returns (laptops, model) data schemas."""
+    laptops = DataSchema(
+        default_value="teststorage:test_datasets/toy datasets/laptop_price.csv",
+        data_type="uri_file",
+        ml_client=get_client(),
+    )
 
+    model = DataSchema(
+        default_value="teststorage:test_datasets/models/laptop_price_model.pkl",
+        data_type="uri_file",
+        description="trained pickle model",
+        ml_client=get_client(),
+    )
+    return laptops, model
 
-model = DataSchema(
-    default_value="teststorage:test_datasets/models/laptop_price_model.pkl",
-    data_type="uri_file",
-    description="trained pickle model",
-)
 
-# 4. DEFINE COMPONENTS:
-prep_component = command(
-    name="preprocess",
-    description="preprocess passed 'laptop_price_data' data",
-    inputs={"laptop_price_data": laptops.as_input()},
-    outputs={
-        "preprocessed_laptops_data": laptops.as_output(value="teststorage:test_datasets/preprocessed_laptops.csv"),
-    },
-    environment=env,
-    code="src/",
-    command="""python components/preprocess/main.py \
-            --laptop_price_data ${{inputs.laptop_price_data}}\
-            --preprocessed_laptops_data ${{outputs.preprocessed_laptops_data}}
-            """,
-    is_deterministic=False,
-)
+# 4. DEFINE COMPONENTS: built once per env, nothing is requested from aml on import
+@lru_cache(maxsize=None)
+def _prep(env_id: str):
+    laptops, _ = get_data_schemas()
+    return command(
+        name="preprocess",
+        description="preprocess passed 'laptop_price_data' data",
+        inputs={"laptop_price_data": laptops.as_input()},
+        outputs={
+            "preprocessed_laptops_data": laptops.as_output(value="teststorage:test_datasets/preprocessed_laptops.csv"),
+        },
+        environment=env_id,
+        code="src/",
+        command="""python components/preprocess/main.py \
+                --laptop_price_data ${{inputs.laptop_price_data}}\
+                --preprocessed_laptops_data ${{outputs.preprocessed_laptops_data}}
+                """,
+        is_deterministic=False,
+    )
 
 
-train_component = command(
-    name="train",
-    description="train model on passed 'preprocessed_laptops_data' data.",
-    inputs={
-        "preprocessed_laptops_data": laptops.as_input("teststorage:test_datasets/preprocessed_laptops.csv"),
-        "test_size": 0.15,
-    },
-    outputs={
-        "trained_model": model.as_output(),
-    },
-    environment=env,
-    code="src/",
-    command="""python components/train/main.py \
-            --preprocessed_laptops_data ${{inputs.preprocessed_laptops_data}}\
-            --test_size ${{inputs.test_size}}\
-            --trained_model ${{outputs.trained_model}}
-            """,
-    is_deterministic=False,
-)
+@lru_cache(maxsize=None)
+def _train(env_id: str):
+    laptops, model = get_data_schemas()
+    return command(
+        name="train",
+        description="train model on passed 'preprocessed_laptops_data' data.",
+        inputs={
+            "preprocessed_laptops_data": laptops.as_input("teststorage:test_datasets/preprocessed_laptops.csv"),
+            "test_size": 0.15,
+        },
+        outputs={
+            "trained_model": model.as_output(),
+        },
+        environment=env_id,
+        code="src/",
+        command="""python components/train/main.py \
+                --preprocessed_laptops_data ${{inputs.preprocessed_laptops_data}}\
+                --test_size ${{inputs.test_size}}\
+                --trained_model ${{outputs.trained_model}}
+                """,
+        is_deterministic=False,
+    )
 
 
-predict_component = command(
-    name="predict",
-    description="predict 'laptops_to_predict' data using 'trained_model' model.",
-    inputs={
-        "trained_model": model.as_input(),
-        "laptops_to_predict": laptops.as_input(value="teststorage:test_datasets/toy datasets/laptop_price_clone.csv"),
-    },
-    outputs={
-        "prediction_data": laptops.as_output(value="teststorage:test_datasets/model_prediction.csv"),
-    },
-    environment=env,
-    environment_variables={"MAIL_PASSWORD": get_secret("loy-fraud-secret-email-app-password")},
-    code="src/",
-    command="""python components/predict/main.py \
-            --laptops_to_predict ${{inputs.laptops_to_predict}}\
-            --trained_model ${{inputs.trained_model}}\
-            --prediction_data ${{outputs.prediction_data}}
-            """,
-    is_deterministic=False,
-)
+@lru_cache(maxsize=None)
+def _predict(env_id: str):
+    laptops, model = get_data_schemas()
+    return command(
+        name="predict",
+        description="predict 'laptops_to_predict' data using 'trained_model' model.",
+        inputs={
+            "trained_model": model.as_input(),
+            "laptops_to_predict": laptops.as_input(
+                value="teststorage:test_datasets/toy datasets/laptop_price_clone.csv"
+            ),
+        },
+        outputs={
+            "prediction_data": laptops.as_output(value="teststorage:test_datasets/model_prediction.csv"),
+        },
+        environment=env_id,
+        environment_variables={"MAIL_PASSWORD": get_secret("loy-fraud-secret-email-app-password")},
+        code="src/",
+        command="""python components/predict/main.py \
+                --laptops_to_predict ${{inputs.laptops_to_predict}}\
+                --trained_model ${{inputs.trained_model}}\
+                --prediction_data ${{outputs.prediction_data}}
+                """,
+        is_deterministic=False,
+    )
+
+
+def get_components() -> tuple:
+    """Returns (prep, train, predict) components, each one is built once per process."""
+    env = get_env()
+    env_id = f"azureml:{env.name}:{env.version}"
+    return _prep(env_id), _train(env_id), _predict(env_id)
 
 
 # 5. DEFINE PIPELINES
 @pipeline(name=PIPELINE_NAME, display_name=PIPELINE_NAME, description=DESCRIPTION, default_compute=COMPUTE)
 def train_model(laptop_price_data):
+    prep_component, train_component, _ = get_components()
     prep = prep_component(laptop_price_data=laptop_price_data)
     train = train_component(preprocessed_laptops_data=prep.outputs.preprocessed_laptops_data)
     trained_model = train.outputs.trained_model
@@ -117,6 +213,7 @@ def train_model(laptop_price_data):
     default_compute=COMPUTE,
 )
 def predict(laptops_to_predict, model):
+    prep_component, _, predict_component = get_components()
     preprocessed_data = prep_component(laptop_price_data=laptops_to_predict).outputs.preprocessed_laptops_data
     prediction = predict_component(laptops_to_predict=preprocessed_data, trained_model=model).outputs.prediction_data
     return {"prediction": prediction}
@@ -129,18 +226,22 @@ def predict(laptops_to_predict, model):
     default_compute=COMPUTE,
 )
 def train_predict(laptop_price_data, laptop_price_data_test):
+    prep_component, train_component, predict_component = get_components()
+    # independent branches - both preprocess steps are on the first level of the graph and run concurrently
     prep = prep_component(laptop_price_data=laptop_price_data)
-    train = train_component(preprocessed_laptops_data=prep.outputs.preprocessed_laptops_data)
-    trained_model = train.outputs.trained_model
+    prep_test = prep_component(laptop_price_data=laptop_price_data_test)
 
-    preprocessed_data = prep_component(laptop_price_data=laptop_price_data_test).outputs.preprocessed_laptops_data
+    train = train_component(preprocessed_laptops_data=prep.outputs.preprocessed_laptops_data)
     prediction = predict_component(
-        laptops_to_predict=preprocessed_data, trained_model=trained_model
+        laptops_to_predict=prep_test.outputs.preprocessed_laptops_data, trained_model=train.outputs.trained_model
     ).outputs.prediction_data
     return {"prediction": prediction}
 
 
 if __name__ == "__main__":
+    client = get_client()
+    laptops, _ = get_data_schemas()
+
     # 6. call pipeline - build jobs
     train_predict_job = train_predict(
         laptop_price_data=laptops.as_input(),
@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from numbers import Number
 from pathlib import Path
 from typing import Any, Literal, Optional, Union
@@ -8,7 +9,35 @@ from loguru import logger
 
 from core.ds_constants import get_ml_client
 
-logger.level = "INFO"
+# `AML_QUIET=1` silences logs of this module
+if os.environ.get("AML_QUIET") == "1":
+    logger.disable(__name__)
+
+
+_URI_PREFIXES = (
+    "azureml:",
+    "https://",
+    "http://",
+    "wasbs://",
+    "abfss://",
+    "adl://",
+)
+
+
+@lru_cache(maxsize=256)
+def _is_local_path(path: Union[str, Number, bool]) -> bool:
+    # todo: not a clear way RM[3]
+    try:
+        path = Path(path)
+        return path.is_file() or path.is_dir()
+    except Exception:
+        return False
+
+
+@lru_cache(maxsize=1)
+def _workspace_from_env() -> tuple:
+    """(subscription_id, resource_group, workspace_name) from env vars, read once per process."""
+    return os.environ["SUBSCRIPTION_ID"], os.environ["RESOURCE_GROUP"], os.environ["WORKSPACE_NAME"]
 
 
 def get_aml_uri(short_path: str) -> str:
@@ -16,19 +45,11 @@ def get_aml_uri(short_path: str) -> str:
     Params:
         short_path: str - path with format `datastore_name: path/to/somewhare`.
     """
-    uri = "azureml://subscriptions/{subs}/resourcegroups/{rg}/workspaces/{ws}/datastores/{ds}/paths/{pth}"
-    ds_name = short_path.split(":")[0].strip()
-    path_on_ds = short_path.split(":")[1].strip()
-    if path_on_ds.startswith("/"):
-        path_on_ds = path_on_ds[1:]  # rm leading '/'
-    uri = uri.format(
-        subs=os.environ["SUBSCRIPTION_ID"],
-        rg=os.environ["RESOURCE_GROUP"],
-        ws=os.environ["WORKSPACE_NAME"],
-        ds=ds_name,
-        pth=path_on_ds,
-    )
-    return uri
+    ds_name, _, path_on_ds = short_path.partition(":")
+    ds_name = ds_name.strip()
+    path_on_ds = path_on_ds.lstrip(" /").rstrip()  # rm leading '/'
+    subs, rg, ws = _workspace_from_env()
+    return f"azureml://subscriptions/{subs}/resourcegroups/{rg}/workspaces/{ws}/datastores/{ds_name}/paths/{path_on_ds}"  # NOQA E501
 
 
 class DataSchema:
@@ -96,7 +117,7 @@ class DataSchema:
         self.__validate()
 
     def __validate(self: "DataSchema"):
-        logger.info("Validating Data")
+        logger.debug("Validating Data")
         assert (
             self.data_type in self.INPUTS
         ), f"Unsupported data type: {self.data_type}. \n\tMust be one of: {self.INPUTS}"
@@ -105,25 +126,21 @@ class DataSchema:
         """Build uri according to the custom uri(curi)
         self.default_value - CURI like `<datastore_name>:/path/to/data`.
         """
-        logger.info(f"Building uri for {short_uri}")
+        logger.opt(lazy=True).debug("Building uri for {}", lambda: short_uri)
         # extract creds from client
         subscription_id = self.client.subscription_id
         resource_group = self.client.resource_group_name
         workspace = self.client.workspace_name
         # get datastore name:
         #   I guess, there are will be some one who will write as `<datastorename>:/path/to/data`, so check and fix it
-        ind = short_uri.index(":")
-        # ':' is last - dont do anything
-        if len(short_uri) != ind + 1 and short_uri[ind + 1] == "/":
-            # remove symbol at index i+1 --> '/'
-            short_uri = short_uri[: ind + 1] + short_uri[ind + 2 :]
-        logger.debug(f"path turned to {short_uri}")
-
-        ds_name = short_uri.split(":")[0]
-        data_path = short_uri.split(":")[1]
-        uri = f"""azureml://subscriptions/{subscription_id}/resourcegroups/{resource_group}/workspaces/{workspace}/datastores/{ds_name}/paths/{data_path}"""  # NOQA E501
-
-        logger.info(f"Built uri: {uri}")
+        ds_name, _, data_path = short_uri.partition(":")
+        if data_path.startswith("/"):
+            data_path = data_path[1:]  # rm leading '/'
+        logger.opt(lazy=True).debug("path turned to {}:{}", lambda: ds_name, lambda: data_path)
+
+        uri = f"azureml://subscriptions/{subscription_id}/resourcegroups/{resource_group}/workspaces/{workspace}/datastores/{ds_name}/paths/{data_path}"  # NOQA E501
+
+        logger.opt(lazy=True).debug("Built uri: {}", lambda: uri)
         return uri
 
     def __to_aml(
@@ -168,36 +185,15 @@ class DataSchema:
 
     def __value2uri(self, value: Union[str, Number, bool]) -> Union[str, None]:
         """check, if value needs to be converted to aml."""
-
-        def has_uri_prefix(value: str) -> bool:
-            uri_prefixes = [
-                "azureml:",
-                "https://",
-                "http://",
-                "wasbs://",
-                "abfss://",
-                "adl://",
-            ]
-            return any(value.startswith(prefix) for prefix in uri_prefixes)
-
-        def is_local_path(path: str) -> bool:
-            # todo: not a clear way RM[3]
-            try:
-                path = Path(path)
-                return path.is_file() or path.is_dir()
-            except Exception:
-                return False
-
-        # if value is correct aml uri
-
-        if isinstance(value, str) and has_uri_prefix(value):
+        if isinstance(value, str):
+            # if value is correct aml uri
+            if value.startswith(_URI_PREFIXES):
+                return value
+            if ":" in value:
+                return self.__get_ds_uri(value)
+        if _is_local_path(value):
             return value
-        if isinstance(value, str) and ":" in value:
-            return self.__get_ds_uri(value)
-        if is_local_path(value):
-            return value
-        else:
-            return None
+        return None
 
     def __guess_dtype(self: "DataSchema", value: Union[str, Number, bool]) -> Union[str, None]:
         # ? RM-sources[2]
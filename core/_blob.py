@@ -1,30 +1,56 @@
 """ #!!beta - module for handling azure blob storage """
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, partial
 from pathlib import Path
 from pprint import pprint
 from typing import Union
 
 import pandas as pd
 import yaml
-from azure.storage.blob import BlobClient, ContainerClient
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobClient, BlobProperties, ContainerClient
 from dotenv import load_dotenv
-from core.utils import read_table
+
+from core.utils import iter_files, read_table
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # pyyaml built without libyaml
+    from yaml import SafeLoader
+
+
+def _is_dir_marker(blob: BlobProperties) -> bool:
+    """empty blob standing for a directory on hierarchical namespace accounts"""
+    return blob.size == 0 and ((blob.metadata or {}).get("hdi_isfolder") == "true" or blob.name.endswith("/"))
 
 
 class Blob:
     """blob instance class"""
 
-    def __init__(self, _blob: BlobClient):
+    # parallel range requests per blob download
+    max_concurrency = 4
+
+    def __init__(self, _blob: BlobClient, properties: BlobProperties = None):
         """
         Parameters:
             _blob: BlobClient - blob client
+            properties: BlobProperties - already known properties of the blob(e.g. from container listing),
+                requested from the blob on first access if not passed
+        Attributes:
             name: str - name of the blob
             properties: BlobProperties - properties of the blob
         """
         self._blob = _blob
         self.name = _blob.blob_name
-        self.properties = _blob.get_blob_properties()
+        if properties is not None:
+            self.properties = properties
+
+    @cached_property
+    def properties(self) -> BlobProperties:
+        """properties of the blob, requested on first access"""
+        return self._blob.get_blob_properties()
 
     def download_blob(
         self, save_at: Union[str, Path] = "", return_df: bool = False, pd_read_kwargs: dict = None
@@ -35,12 +61,16 @@ class Blob:
             save_at: Union[str, Path] - path to save the blob
             return_df: bool - read and return file as pandas dataframe
         """
-        print(f"\tDownloading blob '{self.name}' size: {self.properties.size} bytes")
-        data = self._blob.download_blob().readall()
+        save_at = Path(save_at)
         os.makedirs(save_at.parent, exist_ok=True)
-
+        # size comes with the first chunk of the download, no need for requesting properties
+        downloader = self._blob.download_blob(max_concurrency=self.max_concurrency)
+        print(f"\tDownloading blob '{self.name}' size: {downloader.size} bytes")
+        # stream into file by chunks, large blobs are fetched with concurrent range requests
         with open(save_at, "wb") as f:
-            f.write(data)
+            downloader.readinto(f)
+        # properties(etag etc.) of the version actually downloaded
+        self.properties = downloader.properties
         print(f"\t\tsaved as '{save_at}'")
 
         if return_df:
@@ -50,23 +80,58 @@ class Blob:
 class Container:
     """blob container instance class"""
 
+    # threads used for concurrent downloads
+    max_workers = 16
+    # above this number of names, existence is checked by listing the container
+    max_exists_checks = 5000
+    # parallel block uploads per file
+    max_concurrency = 4
+
     def __init__(self, _container: ContainerClient):
         self._container = _container
         self.name = _container.container_name
 
+    def _download_one(self, blob: Union[str, BlobProperties], save_at: Path) -> None:
+        properties = None if isinstance(blob, str) else blob
+        Blob(self._container.get_blob_client(blob), properties=properties).download_blob(save_at=save_at)
+
+    def _download_many(self, targets: list) -> None:
+        """download blobs concurrently
+        Parameters:
+            targets: list - list of (blob, save_at) pairs, blob is a name or properties from listing
+        """
+        # several blobs may resolve to the same local file - keep the last one, as serial download would leave it
+        targets = list({Path(save_at): (blob, save_at) for blob, save_at in targets}.values())
+        if not targets:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(targets))) as ex:
+            # consume results for re-raising exceptions from workers
+            list(ex.map(lambda t: self._download_one(*t), targets))
+
+    def _find_missing(self, blob_names: set) -> set:
+        """names from 'blob_names' which don't exist in the container"""
+        if len(blob_names) > self.max_exists_checks:
+            # too many names - single listing is cheaper than a request per name
+            return blob_names - {b.name for b in self._container.list_blobs()}
+
+        def _exists(name: str) -> tuple:
+            return name, self._container.get_blob_client(name).exists()
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(blob_names)))) as ex:
+            return {name for name, exists in ex.map(_exists, blob_names) if not exists}
+
     def download_all(self, save_at: Union[str, Path] = "", keep_hierarchy: bool = True):
         """download all blobs in the container
         Parameters:
             save_at: Union[str, Path] - path to save the blobs
             keep_hierarchy: bool - keep folders structure
         """
+        blobs = list(self._container.list_blobs())
         print("\nTry to download all blobs. Blobs:\n")
-        pprint([b.name for b in self._container.list_blobs()])
+        pprint([b.name for b in blobs])
         print()
-        for blob in self._container.list_blobs():
-            blob = self._container.get_blob_client(blob)
-            save_at_ = Path(save_at) / blob.blob_name if keep_hierarchy else Path(save_at)
-            blob = Blob(blob).download_blob(save_at=save_at_)
+        save_at = Path(save_at)
+        self._download_many([(b, save_at / b.name if keep_hierarchy else save_at / Path(b.name).name) for b in blobs])
 
     def download_folder(self, folder: str, save_at: str = "", keep_hierarchy: bool = True):
         """
@@ -78,23 +143,25 @@ class Container:
         folder = Path(folder)
         save_at = Path(save_at)
         print(f"Downloading folder '{folder}' from container to '{save_at}'")
-        # look for blobs in the folder
-        all_blobs = self._container.list_blobs()
-        blobs = [b for b in all_blobs if b.name.startswith(str(folder))]
-        # convert to blob instances
-        blobs = [Blob(self._container.get_blob_client(b)) for b in blobs if Path(b.name).is_file()]
+        # look for blobs in the folder, filtered by prefix on the server side.
+        # trailing '/' keeps sibling folders like '<folder>_old/' out of the listing
+        prefix = folder.as_posix().rstrip("/") + "/"
+        blobs = [
+            b
+            for b in self._container.list_blobs(name_starts_with=prefix, include=["metadata"])
+            if not _is_dir_marker(b)
+        ]
         print("\tFound blobs: \n")
         pprint([b.name for b in blobs])
         print()
+        targets = []
         for b in blobs:
-            # print(f"\tDownloading '{b.name}' size: {b.properties.size} bytes")
             if keep_hierarchy:
-                save_at_ = save_at / (Path(b.properties.name).relative_to(folder))
+                save_at_ = save_at / (Path(b.name).relative_to(folder))
             else:
-                filename = Path(b.name).name
-                save_at_ = save_at / filename
-            # print(f"save at: {save_at_}")
-            b.download_blob(save_at=save_at_)
+                save_at_ = save_at / Path(b.name).name
+            targets.append((b, save_at_))
+        self._download_many(targets)
 
     def download_these(self, blob_names: list, save_at: str = "", pass_if_doesnt_exist: bool = False):
         """
@@ -104,7 +171,7 @@ class Container:
             save_at: str - path to save the blobs
             pass_if_doesnt_exist: bool - skip if the blob does not exist
         """
-        _diff = set(blob_names) - set([b.name for b in self._container.list_blobs()])
+        _diff = self._find_missing(set(blob_names))
 
         if pass_if_doesnt_exist and _diff:
             print(f"WARNING: these blobs not found[{len(blob_names)}/{len(_diff)}]: {list(_diff)}")
@@ -113,14 +180,19 @@ class Container:
             raise FileNotFoundError(f"these blobs not found[{len(blob_names)}/{len(_diff)}]: {list(_diff)}")
 
         # download
-        for blob_name in set(blob_names) - _diff:
-            blob = self._container.get_blob_client(blob_name)
-            filename = Path(blob_name).name
-            if Path(save_at).is_file():
-                save_at = Path(save_at)
-            else:
-                save_at = Path(save_at) / filename
-            blob = Blob(blob).download_blob(save_at=save_at)
+        save_at = Path(save_at)
+        save_at_is_file = save_at.is_file()
+        self._download_many(
+            [
+                (blob_name, save_at if save_at_is_file else save_at / Path(blob_name).name)
+                for blob_name in dict.fromkeys(blob_names)
+                if blob_name not in _diff
+            ]
+        )
+
+    def get_blob(self, blob_name: str) -> Blob:
+        """blob instance by name, accessing its properties raises 'ResourceNotFoundError' if blob doesn't exist"""
+        return Blob(self._container.get_blob_client(blob_name))
 
     def upload(self, data, to: str, overwrite: bool = False):
         """
@@ -131,13 +203,18 @@ class Container:
             overwrite: bool - overwrite if exists
         """
         print(f"Uploading data to '{to}'")
+        blob = self._container.get_blob_client(to)
         # check data
         if isinstance(data, (str, Path)):
             print("try to read file")
-            data = open(data, "rb")
-
-        blob = self._container.get_blob_client(to)
-        blob.upload_blob(data, overwrite=overwrite)
+            path = os.fspath(data)
+            # known length lets sdk upload blocks in parallel without probing the stream
+            with open(path, "rb") as f:
+                blob.upload_blob(
+                    f, overwrite=overwrite, length=os.path.getsize(path), max_concurrency=self.max_concurrency
+                )
+        else:
+            blob.upload_blob(data, overwrite=overwrite)
         print("\tDone")
 
 
@@ -151,14 +228,24 @@ class BlobHandler:
             sas_url_container: sas url for container
             sas_url_blob: sas url for blob
         Attributes:
-            container: Container - container instance
-            blob: Blob - blob instance
+            container: Container - container instance, built on first access
+            blob: Blob - blob instance, built on first access
         """
         self.__validate(sas_url_container, sas_url_blob)
-        if sas_url_container:
-            self.container = Container(ContainerClient.from_container_url(sas_url_container))
-        if sas_url_blob:
-            self.blob = BlobClient.from_blob_url(sas_url_blob)
+        self.__sas_url_container = sas_url_container
+        self.__sas_url_blob = sas_url_blob
+
+    @cached_property
+    def container(self) -> Union[Container, None]:
+        if self.__sas_url_container:
+            return Container(ContainerClient.from_container_url(self.__sas_url_container))
+        return None
+
+    @cached_property
+    def blob(self) -> Union[BlobClient, None]:
+        if self.__sas_url_blob:
+            return BlobClient.from_blob_url(self.__sas_url_blob)
+        return None
 
     def __validate(self, sas_url_container, sas_url_blob):
         if not sas_url_blob and not sas_url_container:
@@ -174,19 +261,26 @@ class LocalFileUpdater:
     """class for updating local files according to the 'local_file_updater.yaml' file"""
 
     yaml_file_name = "local_file_updater.yaml"
+    # threads used for handling yaml rows
+    max_workers = 8
+    # suffix of the sidecar file keeping etag of the downloaded blob
+    etag_suffix = ".etag"
 
     def __init__(self, directory: Path, dotenv_path: Path = "./.env"):
         """ """
         self.directory = directory
         self.dotenv_path = dotenv_path
 
+    @staticmethod
+    def __get_container_names(yaml_dict: dict) -> set:
+        """unique container names of the yaml rows"""
+        return {next(iter(row.values())).partition(":")[0].upper() for row in yaml_dict["files"]}
+
     @classmethod
     def __get_sass_interactively(cls, yaml_dict: dict) -> None:
         """parse container names and take user input for sas urls"""
-        # list of unique containers
-        containers = list(set([list(blob_row.values())[0].split(":")[0].upper() for blob_row in yaml_dict["files"]]))
         vars_ = {}
-        for container_name in containers:
+        for container_name in cls.__get_container_names(yaml_dict):
             sas_url = input(f"Enter sas url for '{container_name}': ")
             vars_[f"BLOB-{container_name}"] = sas_url
 
@@ -217,65 +311,83 @@ class LocalFileUpdater:
         return sas_url
 
     @classmethod
-    def __update_file(cls, local_file: Path, blob_file: str):
+    def __get_handlers(cls, yaml_dict: dict) -> dict:
+        """blob handlers of all containers from the yaml, shared by all rows: {CONTAINER_NAME: BlobHandler}"""
+        names = cls.__get_container_names(yaml_dict)
+        return {name: BlobHandler(sas_url_container=cls.__get_sas_url(name)) for name in names}
+
+    @classmethod
+    def __update_file(cls, local_file: Path, blob_file: str, handlers: dict):
         """ """
         blob_container_name, blob_file = blob_file.split(":")
-        sas_url = cls.__get_sas_url(blob_container_name)
+        container = handlers[blob_container_name.upper()].container
 
-        # download blob to local
-        BlobHandler(sas_url_container=sas_url).container.download_these(
-            [
-                blob_file,
-            ],
-            save_at=str(local_file),
-        )
+        blob = container.get_blob(blob_file)
+
+        # skip if local file is the same version as the blob, asks blob properties only if there is a version to compare
+        etag_file = local_file.with_name(local_file.name + cls.etag_suffix)
+        try:
+            if local_file.is_file() and etag_file.is_file() and etag_file.read_text() == blob.properties.etag:
+                print(f"\t'{local_file}' is up to date with '{blob_file}'")
+                return
+
+            # download blob to local, into the dir if local path is not a file
+            save_at = local_file if local_file.is_file() else local_file / Path(blob_file).name
+            blob.download_blob(save_at=save_at)
+        except ResourceNotFoundError:
+            raise FileNotFoundError(f"these blobs not found[1/1]: {[blob_file]}")
+
+        # remember downloaded version, write-then-rename for not leaving partial file
+        etag_file = save_at.with_name(save_at.name + cls.etag_suffix)
+        tmp_file = etag_file.with_name(etag_file.name + ".tmp")
+        tmp_file.write_text(blob.properties.etag)
+        os.replace(tmp_file, etag_file)
 
     @classmethod
-    def __handle_yaml_row(cls, file: str, updater_path: Path, only_files_in_dir: bool, keep_onlylocals: bool) -> None:
+    def __handle_yaml_row(
+        cls, file: str, updater_path: Path, only_files_in_dir: bool, keep_onlylocals: bool, handlers: dict
+    ) -> None:
         """ """
         local_file, blob_file = tuple(file.items())[0]
         local_file = Path(updater_path / local_file).resolve()
         if local_file.is_dir():
-            cls.__handle_yaml_row_dir(local_file, blob_file, only_files_in_dir, keep_onlylocals)
+            cls.__handle_yaml_row_dir(local_file, blob_file, only_files_in_dir, keep_onlylocals, handlers)
         else:
-            cls.__handle_yaml_row_file(local_file, blob_file)
+            cls.__handle_yaml_row_file(local_file, blob_file, handlers)
 
     @classmethod
-    def __handle_yaml_row_file(cls, local_file: Path, blob_file: Path):
-        cls.__update_file(local_file, blob_file)
+    def __handle_yaml_row_file(cls, local_file: Path, blob_file: str, handlers: dict):
+        cls.__update_file(local_file, blob_file, handlers)
 
     @classmethod
     def __handle_yaml_row_dir(
-        cls, local_dir: Path, blob_dir: str, only_files_in_dir: bool, keep_onlylocals: bool
+        cls, local_dir: Path, blob_dir: str, only_files_in_dir: bool, keep_onlylocals: bool, handlers: dict
     ) -> None:
         """replace files inside 'local_dir' with files from 'blob_dir'"""
         # print('blob_dir: ', blob_dir)
         container_name, blob_dir = blob_dir.split(":")
+        container = handlers[container_name.upper()].container
         blob_dir = Path(blob_dir)
         # print('blob_dir: ', blob_dir)
         if only_files_in_dir is True:
-            for local_file in local_dir.rglob("*.*"):
+            for local_file in iter_files(local_dir):
+                local_file = Path(local_file)
+                if local_file.name.endswith(cls.etag_suffix):
+                    continue
                 blob_file = blob_dir / local_file.relative_to(local_dir)
-                cls.__update_file(local_file, blob_file)
+                cls.__update_file(local_file, f"{container_name}:{blob_file.as_posix()}", handlers)
         else:
             print(f"Transfer blob dir: '{blob_dir}' into local dir: '{local_dir}'")
             if keep_onlylocals is True:
                 # take each blob and download into local, this will overwrite file if already exists
 
-                BlobHandler(sas_url_container=cls.__get_sas_url(container_name)).container.download_folder(
-                    folder=str(blob_dir), save_at=str(local_dir)
-                )
+                container.download_folder(folder=str(blob_dir), save_at=str(local_dir))
             else:
                 # rm all files from local and download all from blob
-                for old_file in local_dir.rglob("*"):
-                    if old_file.is_file():
-                        old_file.unlink()
-                    else:
-                        shutil.rmtree(old_file)
+                shutil.rmtree(local_dir)
+                local_dir.mkdir(parents=True)
                 # download
-                BlobHandler(sas_url_container=cls.__get_sas_url(container_name)).container.download_folder(
-                    folder=str(blob_dir), save_at=str(local_dir)
-                )
+                container.download_folder(folder=str(blob_dir), save_at=str(local_dir))
 
     @staticmethod
     def __load_yaml(updater_path: Path) -> dict:
@@ -287,9 +399,7 @@ class LocalFileUpdater:
 
         # load yaml file into dict
         with open(yaml_path, "r") as yaml_stream:
-            yml = yaml.load_all(yaml_stream, yaml.Loader).__next__()
-
-        return yml
+            return yaml.load(yaml_stream, Loader=SafeLoader)
 
     @classmethod
     def update_locals(
@@ -328,8 +438,20 @@ class LocalFileUpdater:
             cls.__get_sass_interactively(yaml_dict=yml)
 
         # handle files
-        for file in yml["files"]:
-            cls.__handle_yaml_row(file, updater_path, only_files_in_dir, keep_onlylocals)
+        handlers = cls.__get_handlers(yaml_dict=yml)
+        files = yml["files"]
+        if not files:
+            return
+        # rows are independent - handle them concurrently
+        with ThreadPoolExecutor(max_workers=min(cls.max_workers, len(files))) as ex:
+            handle_row = partial(
+                cls.__handle_yaml_row,
+                updater_path=updater_path,
+                only_files_in_dir=only_files_in_dir,
+                keep_onlylocals=keep_onlylocals,
+                handlers=handlers,
+            )
+            list(ex.map(handle_row, files))
 
     def __str__(self):
         name = f"Container: {self.container.name}" if self.container else "Blob: {self.blob.name}"
@@ -1,9 +1,11 @@
 import re
-from datetime import datetime
+import time
+from collections import Counter
 from pathlib import Path
 from typing import List, Union
 
 import yaml
+from azure.ai.ml import MLClient
 from azure.ai.ml.entities import Environment
 from azure.core.exceptions import ResourceNotFoundError
 from loguru import logger
@@ -12,6 +14,11 @@ from pydantic import BaseModel, ValidationError
 from core.ds_constants import get_ml_client
 from core.settings import settings
 
+# semver like env version: 1.2.3
+_VERSION_RE = re.compile(r"(\d+)\.(\d+)\.(\d+)$")
+# libyaml based loader if pyyaml is built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 # Env Schemas
 class PipDependencies(BaseModel):
@@ -38,7 +45,21 @@ class EnvironmentSchema(BaseModel):
         return diff
 
     def is_equal(self: "EnvironmentSchema", other: "EnvironmentSchema") -> bool:
-        return len(self.compare(other)) == 0
+        return self._first_diff(other) is None
+
+    def _first_diff(self: "EnvironmentSchema", other: "EnvironmentSchema") -> Union[str, None]:
+        """Name of the first different field, same rules as `compare` but stops on the first mismatch."""
+        if self.name != other.name:
+            return "name"
+        if self.channels != other.channels:
+            return "channels"
+        self_conda, self_pip = self._split_dependencies(self.dependencies)
+        other_conda, other_pip = self._split_dependencies(other.dependencies)
+        if len(self_conda) != len(other_conda) or Counter(self_conda) != Counter(other_conda):
+            return "dependencies"
+        if set(self_pip) != set(other_pip):
+            return "dependencies"
+        return None
 
     def _compare_channels(self: "EnvironmentSchema", other: "EnvironmentSchema") -> Union[tuple, dict]:
         if self.channels is None and other.channels is None:
@@ -49,56 +70,53 @@ class EnvironmentSchema(BaseModel):
             return (self.channels, "missing")
         return set(self.channels).symmetric_difference(set(other.channels))
 
+    @staticmethod
+    def _split_dependencies(dependencies: list) -> tuple:
+        """Returns (conda deps, all pip deps) of dependencies list."""
+        conda_deps = [dep for dep in dependencies if isinstance(dep, str)]
+        pip_deps = [pip for dep in dependencies if isinstance(dep, PipDependencies) for pip in dep.pip]
+        return conda_deps, pip_deps
+
     def _compare_dependencies(self: "EnvironmentSchema", other: "EnvironmentSchema") -> dict:
-        diff = {}
-        if len(self.dependencies) != len(other.dependencies):
-            diff["length"] = (len(self.dependencies), len(other.dependencies))
-
-        for i, (self_dep, other_dep) in enumerate(
-            zip(self.dependencies, other.dependencies),
-        ):
-            if isinstance(self_dep, str) and isinstance(other_dep, str):
-                if self_dep != other_dep:
-                    diff[f"item_{i}"] = (self_dep, other_dep)
-            elif isinstance(self_dep, PipDependencies) and isinstance(
-                other_dep,
-                PipDependencies,
-            ):
-                if self_dep.pip != other_dep.pip:
-                    diff[f"pip_{i}"] = set(self_dep.pip).symmetric_difference(
-                        set(other_dep.pip),
-                    )
-            else:
-                diff[f"type_mismatch_{i}"] = (type(self_dep), type(other_dep))
+        """Order-insensitive diff: conda deps 'added'/'removed' in self relative to other, and 'pip_diff'."""
+        self_conda, self_pip = self._split_dependencies(self.dependencies)
+        other_conda, other_pip = self._split_dependencies(other.dependencies)
+        self_counter, other_counter = Counter(self_conda), Counter(other_conda)
 
-        return diff
+        diff = {
+            "added": sorted((self_counter - other_counter).elements()),
+            "removed": sorted((other_counter - self_counter).elements()),
+            "pip_diff": set(self_pip).symmetric_difference(other_pip),
+        }
+        return {key: value for key, value in diff.items() if value}
 
 
 def increment_version(version_string: str, increment: bool = True) -> str:
     """Increments passed version string, if uses timestamp if version not numeric."""
-    pattern = r"(\d+)\.(\d+)\.(\d+)"
-    default_version = str(datetime.now().timestamp()).split(".")[0]
-    if not (re.match(pattern, version_string) or version_string.isdigit()):
+    if not (_VERSION_RE.match(version_string) or version_string.isdigit()):
+        default_version = settings.default_env_version()
         logger.warning(
-            f"Env version label {version_string} does not match pattern {pattern}, so return '{default_version}' ",
+            f"Env version label {version_string} does not match pattern {_VERSION_RE.pattern}, "
+            f"so return '{default_version}' ",
         )
         return default_version
 
+    step = 1 if increment else -1
     if version_string.isdigit():
-        return increment and f"{int(version_string) + 1}" or f"{int(version_string) - 1}"
+        return f"{int(version_string) + step}"
 
-    parts = list(map(int, version_string.split(".")))
-    if increment:
-        parts[-1] += 1
-    else:
-        parts[-1] -= 1
-    return ".".join(map(str, parts))
+    # only the last part changes
+    head, _, tail = version_string.rpartition(".")
+    return f"{head}.{int(tail) + step}"
 
 
 class Env:
     """class contains aml env based ops."""
 
-    ml_client = get_ml_client()
+    _ml_client = None
+    # seconds for which result of `get_latest` is reused
+    latest_ttl = 60
+    _latest_cache: dict = {}  # env_name -> (monotonic time, Environment)
 
     def __init__(
         self: "Env",
@@ -118,24 +136,37 @@ class Env:
             msg = f"Conda file not found: {self.conda_file_path}"
             raise ValueError(msg)
 
+    @classmethod
+    def ml_client(cls: "Env") -> MLClient:
+        """Client of the workspace, created on first call."""
+        if cls._ml_client is None:
+            cls._ml_client = get_ml_client()
+        return cls._ml_client
+
     @classmethod
     def get_latest(cls: "Env", env_name: str) -> Environment:
         """Get latest version of aml env with given name.
         Actually, you can use `ml_client.environments.get(name, label='latest')`,
         but it will return 'Anonymous' environment, without any version.
+        Result is reused for `latest_ttl` seconds.
         """
+        cached = cls._latest_cache.get(env_name)
+        if cached is not None and time.monotonic() - cached[0] < cls.latest_ttl:
+            return cached[1]
         try:
-            env_list = list(cls.ml_client.environments.list(name=env_name))
-            return [env for env in env_list if env.properties["azureml.labels"] == "latest"][0]
+            env_list = list(cls.ml_client().environments.list(name=env_name))
+            latest = [env for env in env_list if env.properties["azureml.labels"] == "latest"][0]
         except ResourceNotFoundError:
-            return None
+            latest = None
+        cls._latest_cache[env_name] = (time.monotonic(), latest)
+        return latest
 
     @classmethod
     def get_if_exists(cls: "Env", name: str, version: Union[str, None] = None) -> Union[Environment, None]:
         """Get aml env with given name."""
         if version:
             try:
-                return cls.ml_client.environments.get(
+                return cls.ml_client().environments.get(
                     name,
                     version=version,
                     label="latest" if version is None else None,
@@ -173,13 +204,15 @@ class Env:
         if latest is None:
             new_env = Environment(
                 name=self.env_name,
+                version=create_version or settings.default_env_version(),
                 description=create_description or settings.ENV_DEFAULT_DESCRIPTION.format(env_name=self.env_name),
                 tags=create_tags or settings.ENV_DEFAULT_TAGS,
                 conda_file=self.conda_file_path.as_posix(),
                 image=create_image or settings.ENV_DEFAULT_IMAGE,
             )
 
-            self.ml_client.environments.create_or_update(new_env)
+            self.ml_client().environments.create_or_update(new_env)
+            self._latest_cache.pop(self.env_name, None)  # latest is changed
             return new_env
 
         # Env is exists, check if it has changed according to the conda file:
@@ -189,7 +222,7 @@ class Env:
         logger.info(f"Looking for changes in conda file: {self.conda_file_path}")
 
         with open(self.conda_file_path) as f:
-            local_conda = yaml.safe_load(f).copy()
+            local_conda = yaml.load(f, Loader=_YAML_LOADER).copy()
         remote_conda = latest.conda_file.copy()
 
         # fill schemas
@@ -204,8 +237,8 @@ class Env:
             )
 
         # if env changed - update it!
-        if not remote_schema.is_equal(local_schema):
-            diff = local_schema.compare(remote_schema)
+        diff = local_schema.compare(remote_schema)
+        if diff:
             logger.info(
                 f"Local context is different from remote one:\n{diff}\nUpdating...",
             )
@@ -233,7 +266,8 @@ class Env:
             logger.info(
                 f"Pushing {updated_env.name} with version {updated_env.version}...",
             )
-            self.ml_client.environments.create_or_update(updated_env)
+            self.ml_client().environments.create_or_update(updated_env)
+            self._latest_cache.pop(self.env_name, None)  # latest is changed
             logger.info(
                 f"Environment '{updated_env.name}' successfully updated from\
                 {latest.version} to {updated_env.version}.",
@@ -8,18 +8,26 @@ import yaml
 
 from core.settings import settings
 
+# libyaml based dumper if pyyaml is built with it
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
 
 def get_git_config() -> dict:
     """Returns dict of repo config."""
+    keys = {"user.name": "username", "user.email": "email", "remote.origin.url": "remote_url"}
+    config = dict.fromkeys(keys.values(), "unknown")
     try:
-        username = subprocess.check_output(["git", "config", "user.name"]).decode("utf-8").strip()
-        email = subprocess.check_output(["git", "config", "user.email"]).decode("utf-8").strip()
-        remote_url = subprocess.check_output(["git", "ls-remote", "--get-url", "origin"]).decode("utf-8").strip()
+        # one local read for all keys, no remote calls
+        output = subprocess.check_output(
+            ["git", "config", "--get-regexp", r"^(user\.name|user\.email|remote\.origin\.url)$"]
+        ).decode("utf-8")
     except Exception:
-        username = "unknown"
-        email = "unknown"
-        remote_url = "unknown"
-    return {"username": username, "email": email, "remote_url": remote_url}
+        return config
+    for line in output.splitlines():
+        key, _, value = line.partition(" ")
+        if key in keys:
+            config[keys[key]] = value.strip()
+    return config
 
 
 def get_infofile_content(
@@ -44,7 +52,7 @@ def get_infofile_content(
     if kwargs:
         yaml_dict.update(kwargs)
 
-    return yaml.dump(yaml_dict, indent=4)
+    return yaml.dump(yaml_dict, Dumper=_YAML_DUMPER, indent=4)
 
 
 def build_infofile(
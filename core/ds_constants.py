@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from pathlib import Path
 import requests
 from typing import List, Optional, Union
@@ -54,15 +55,31 @@ def get_ml_client(from_config: Path = 'config.json',
         
 
 
+_default_credential = None
+_secret_clients = {}    # (keyvault_name, credential) -> SecretClient
+
+
+def _get_secret_client(keyvault_name: str, credential=None) -> SecretClient:
+    """ returns SecretClient of the keyvault, credential and client are created once and reused """
+    global _default_credential
+    if not credential:
+        if _default_credential is None:
+            _default_credential = DefaultAzureCredential()
+        credential = _default_credential
+    key = (keyvault_name, credential)
+    if key not in _secret_clients:
+        vault_url = f"https://{keyvault_name}.vault.azure.net/"
+        _secret_clients[key] = SecretClient(vault_url=vault_url, credential=credential)
+    return _secret_clients[key]
+
+
+@lru_cache(maxsize=128)
 def get_secret(secret_name: str, 
                keyvault_name="ds-ml", 
                credential=None) -> str:
-    """ get secret from keyvault """
-    if not credential:
-        credential = DefaultAzureCredential()
+    """ get secret from keyvault, each secret is requested once per process """
     logger.info(f"Getting secret: {secret_name}; keyvault_name: {keyvault_name}")
-    vault_url = f"https://{keyvault_name}.vault.azure.net/"
-    secret_client = SecretClient(vault_url=vault_url, credential=credential)
+    secret_client = _get_secret_client(keyvault_name, credential)
     secret = secret_client.get_secret(secret_name)
     return secret.value
 
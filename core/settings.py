@@ -14,9 +14,13 @@ class Settings:
 
     ENV_DEFAULT_IMAGE = "mcr.microsoft.com/azureml/openmpi4.1.0-ubuntu20.04:latest"
     ENV_DEFAULT_DESCRIPTION = "Environment created by DSML SDK v2: {env_name}"
-    ENV_DEFAULT_VERSION = str(datetime.now().timestamp()).split(".")[0]  # noqa: DTZ005
     ENV_DEFAULT_TAGS = None
     DEFAULT_INFOFILE_NAME = "aml_pipeline_info.yaml"
 
+    @staticmethod
+    def default_env_version() -> str:
+        """timestamp based env version, taken at call time - not at import."""
+        return str(int(datetime.now().timestamp()))  # noqa: DTZ005
+
 
 settings = Settings()
@@ -1,27 +1,70 @@
-import glob
-from gc import collect
+import heapq
+import os
 from pathlib import Path
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import csv as pacsv
 
 # from azure.ai.ml import command, Input, Output
 
 
+def iter_files(root: Path, suffix: str = ""):
+    """yields paths(str) of all files under `root` recursively, optionally only ones ending with `suffix`"""
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(suffix):
+                    yield entry.path
+
+
+def _read_parquet(file: Path, **kwargs) -> pd.DataFrame:
+    return pq.read_table(file, **kwargs).to_pandas(split_blocks=True, self_destruct=True)
+
+
+_READERS = {
+    "csv": pd.read_csv,
+    "parquet": _read_parquet,
+    "json": pd.read_json,
+    "xls": pd.read_excel,
+    "xlsx": pd.read_excel,
+}
+
+
+def _read_dataset(files: list, ext: str) -> pd.DataFrame:
+    """reads [csv, parquet] files into one dataframe with pyarrow.
+    Schemas are unified like `pd.concat` does: missing columns are filled with nulls, types are promoted.
+    """
+    if not files:
+        raise ValueError("No files to read")
+    files = [str(f) for f in files]
+    if ext == "parquet":
+        # schemas come from the footers only, the files themselves are scanned in parallel
+        schema = pa.unify_schemas([pq.read_schema(f) for f in files], promote_options="permissive")
+        table = ds.dataset(files, format="parquet", schema=schema).to_table(use_threads=True)
+    else:
+        # csv types are inferred per file, so read one by one and promote on concat
+        tables = [pacsv.read_csv(f) for f in files]
+        table = pa.concat_tables(tables, promote_options="permissive")
+        del tables
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
 def read_table(file: Path, kwargs=None) -> pd.DataFrame:
     """reads [csv, parquet, json, excel] table from file"""
     assert file.exists()
 
-    readers = {
-        "csv": pd.read_csv,
-        "parquet": pd.read_parquet,
-        "json": pd.read_json,
-        "xls": pd.read_excel,
-        "xlsx": pd.read_excel,
-    }
-    if file.suffix[1:] not in readers.keys():
-        raise ValueError(f"Unsupported file type: {file.suffix[1:]}")
+    ext = file.suffix[1:]
+    reader = _READERS.get(ext)
+    if reader is None:
+        raise ValueError(f"Unsupported file type: {ext}")
 
-    return readers[file.suffix[1:]](file, **(kwargs or {}))
+    return reader(file, **(kwargs or {}))
 
 
 def merge_all(
@@ -55,18 +98,14 @@ def merge_all(
     # do
     if not silent_mode:
         print(f"Starting for {len(dfs)} dfs:")
-    left = dfs[0].copy()
+    # merge returns a new frame, inputs are never modified - no need for copies
+    left = dfs[0]
     for i in range(1, len(dfs)):
-        right = dfs[i].copy()
         if not silent_mode:
             print(f"\tMerging df {i}")
+        left = left.merge(dfs[i], on=on, how=how)
         if drop_dups is True:
-            left = left.merge(right, on=on, how=how).drop_duplicates(keep="first")
-        else:
-            left = left.merge(right, on=on, how=how)
-        collect()
-    del right, dfs
-    collect()
+            left = left.drop_duplicates(keep="first")
     return left
 
 
@@ -74,16 +113,13 @@ def get_last_n_dir(path: Path, n: int, ext="csv") -> list:
     """
     returns last n files from structure like `dir/year/month/day/file.ext`
     """
-    files = list(path.rglob(f"*.{ext}"))
-    files_processed = [list(reversed(str(p).split("/")[-2:-5:-1])) for p in files]
-    weights = []
-    for pth in files_processed:
-        weights.append(sum([int(pth[0] * 100), int(pth[1] * 10), int(pth[2] * 1)]))
 
-    mapping = {file: weight for file, weight in zip(files, weights)}
+    def date_key(p: str) -> tuple:
+        year, month, day = p.rsplit(os.sep, 4)[-4:-1]
+        return int(year), int(month), int(day)
 
-    files_sorted = list(sorted(files, reverse=True, key=lambda f: mapping[f]))
-    return files_sorted[:n]
+    # lazy walk, only n paths are kept in memory
+    return [Path(p) for p in heapq.nlargest(n, iter_files(path, f".{ext}"), key=date_key)]
 
 
 def read_concat_all(folder: Path, ext: str = "csv") -> pd.DataFrame:
@@ -93,17 +129,17 @@ def read_concat_all(folder: Path, ext: str = "csv") -> pd.DataFrame:
     """
     assert folder.exists(), f"Folder not found: {folder}"
     assert ext in ["csv", "parquet", "json", "xls", "xlsx"], f"Unsupported ext: {ext}"
-    files = list(folder.rglob(f"*.{ext}"))
+    files = [Path(f) for f in iter_files(folder, f".{ext}")]
+    if ext in ("csv", "parquet"):
+        # arrow reads all files in parallel into a single table
+        return _read_dataset(files, ext)
     dfs = [read_table(f) for f in files]
     return pd.concat(dfs)
 
 
 def recursive_glob_list(folders: list, file_ext: str = "parquet"):
     """Takes a list of folders and returns a list of files recursively"""
-    files = []
-    for f in folders:
-        files += glob.glob(f"{f}/**/*.{file_ext}", recursive=True)
-    return files
+    return [file for f in folders for file in iter_files(f, f".{file_ext}")]
 
 
 def get_last_n_days(path: Path, days=90, freq=2, folder_name="folder"):
@@ -111,19 +147,10 @@ def get_last_n_days(path: Path, days=90, freq=2, folder_name="folder"):
     beta
     """
 
-    def get_file_mark_mapping(files: list, dir_name: str):
-        res = {}
-        for file in files:
-            tmp_name = file.split(f"/{dir_name}/")[-1].split("/")[:-1]
-            tmp_name = list(reversed([int(t) for t in tmp_name]))
-            tmp_name = sum([t * (10**i) for i, t in enumerate(tmp_name, start=0)])
-            res[file] = tmp_name
-        return res
+    def date_key(file: str) -> tuple:
+        # `.../folder_name/year/month/day/file.parquet` -> (year, month, day)
+        return tuple(int(t) for t in file.split(f"/{folder_name}/")[-1].split("/")[:-1])
 
     get_last = days // freq
-    files = recursive_glob_list([path])
-    mapping = get_file_mark_mapping(files, dir_name=folder_name)
-    sorted_files = sorted(files, key=lambda file: mapping[file], reverse=True)
-    last_files = sorted_files[:get_last]
-    dfs = [pd.read_parquet(df) for df in last_files]
-    return pd.concat(dfs)
+    last_files = heapq.nlargest(get_last, recursive_glob_list([path]), key=date_key)
+    return _read_dataset(last_files, "parquet")
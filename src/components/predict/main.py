@@ -1,8 +1,9 @@
-import pickle
 from argparse import ArgumentParser
 
-import pandas as pd
+import joblib
+import pyarrow as pa
 from predict import predict, send_mail_absolute
+from pyarrow import csv as pacsv
 
 parser = ArgumentParser()
 
@@ -12,14 +13,17 @@ parser.add_argument("--prediction_data", type=str, help="prediction out file")
 args = parser.parse_args()
 
 
-data = pd.read_csv(args.laptops_to_predict)
-model = pickle.load(open(args.trained_model, "rb"))
+table = pacsv.read_csv(args.laptops_to_predict)
+data = table.to_pandas(split_blocks=True, self_destruct=True)
+del table
+# tree arrays are memory-mapped instead of copied into memory
+model = joblib.load(args.trained_model, mmap_mode="r")
 
 print("Predicting price")
 result = predict(data, model)
 
 # save result
-result.to_csv(args.prediction_data)
+pacsv.write_csv(pa.Table.from_pandas(result, preserve_index=False), args.prediction_data)
 print(f"Data with predictions saved in: '{args.prediction_data}'")
 
 # send email
@@ -1,17 +1,18 @@
 import os
 import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
+from sklearn.pipeline import Pipeline
 from typing import List
 
 from email.message import EmailMessage
 import smtplib
 
-def predict(data: pd.DataFrame, model: RandomForestRegressor) -> pd.DataFrame:
-    scaler = StandardScaler()
-    X = data.drop("Price_euros", axis=1) if "Price_euros" in data.columns.values else data.copy()
-    X_scaled = scaler.fit_transform(X)
-    preds = model.predict(X_scaled)
+def predict(data: pd.DataFrame, model: Pipeline) -> pd.DataFrame:
+    """predict with trained pipeline, it scales data with the scaler fitted on train data"""
+    if not isinstance(model, Pipeline):
+        # models saved before the scaler became a part of the pipeline expect scaled data
+        raise TypeError(f"retrain: model must include its scaler, got '{type(model).__name__}' instead of Pipeline")
+    X = data.drop("Price_euros", axis=1) if "Price_euros" in data.columns.values else data
+    preds = model.predict(X.to_numpy())
     data.loc[:, "predicted_price"] = preds
     return data
 
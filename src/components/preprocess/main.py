@@ -1,7 +1,8 @@
 from argparse import ArgumentParser
 
-import pandas as pd
+import pyarrow as pa
 from prep import preprocess
+from pyarrow import csv as pacsv
 
 parser = ArgumentParser()
 
@@ -9,11 +10,13 @@ parser.add_argument("--laptop_price_data", type=str, help="laptops data path")
 parser.add_argument("--preprocessed_laptops_data", type=str, help="preprocessed data output")
 args = parser.parse_args()
 
-laptops_data = pd.read_csv(args.laptop_price_data, encoding="latin-1")
+table = pacsv.read_csv(args.laptop_price_data, read_options=pacsv.ReadOptions(encoding="latin-1"))
+laptops_data = table.to_pandas(split_blocks=True, self_destruct=True)
+del table
 print("Preprocess data:")
 prep_data = preprocess(laptops_data)
 print("\tDone")
 
 # save
-prep_data.to_csv(args.preprocessed_laptops_data, index=False)
+pacsv.write_csv(pa.Table.from_pandas(prep_data, preserve_index=False), args.preprocessed_laptops_data)
 #
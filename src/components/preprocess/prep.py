@@ -1,58 +1,64 @@
+import numpy as np
 import pandas as pd
 from loguru import logger
 
-def turn_memory_into_MB(value):
-    if "GB" in value:
-        return float(value[: value.find("GB")]) * 1000
-    elif "TB" in value:
-        return float(value[: value.find("TB")]) * 1000000
+MEMORY_UNITS_IN_MB = {"GB": 1000, "TB": 1000000}
+# categorical column -> suffix of its one-hot columns
+CATEGORICAL_SUFFIXES = {"Company": "", "TypeName": "", "OpSys": "", "CPU Brand": "_CPU", "GPU Brand": "_GPU"}
+# columns replaced by parsed or one-hot ones
+RAW_COLUMNS = ["Product", "Company", "TypeName", "ScreenResolution", "Cpu", "Ram", "Memory", "Gpu", "OpSys", "Weight"]
+
+
+def turn_memory_into_MB(values: pd.Series) -> pd.Series:
+    """'256GB', '1.0TB' -> 256000.0, 1000000.0"""
+    amount = pd.to_numeric(values.str[:-2], errors="coerce")
+    return amount * values.str[-2:].map(MEMORY_UNITS_IN_MB)
+
+
+def target_correlation(df: pd.DataFrame, target: str) -> pd.Series:
+    """pearson correlation of each numeric column with `target` column, only one row of `df.corr()` is computed"""
+    num = df.select_dtypes(include=[np.number, "bool"]).astype(np.float64)
+    # pairwise complete rows, same NaN handling as `df.corr()`
+    return num.corrwith(num[target])
 
 
 def preprocess(laptops: pd.DataFrame) -> pd.DataFrame:
     """preprocess passed 'laptop_price_data' data"""
-    laptops = laptops.copy()
-    laptops = laptops.drop("Product", axis=1)
-    laptops = laptops.join(pd.get_dummies(laptops.Company))
-    laptops = laptops.drop("Company", axis=1)
-    laptops = laptops.join(pd.get_dummies(laptops.TypeName))
-    laptops = laptops.drop("TypeName", axis=1)
-    laptops["ScreenResolution"] = laptops.ScreenResolution.str.split(" ").apply(lambda x: x[-1])
-    laptops["Screen Width"] = laptops.ScreenResolution.str.split("x").apply(lambda x: x[0])
-    laptops["Screen Height"] = laptops.ScreenResolution.str.split("x").apply(lambda x: x[1])
-    laptops = laptops.drop("ScreenResolution", axis=1)
-    laptops["CPU Brand"] = laptops.Cpu.str.split(" ").apply(lambda x: x[0])
-    laptops["CPU Frequency"] = laptops.Cpu.str.split(" ").apply(lambda x: x[-1])
-    laptops = laptops.drop("Cpu", axis=1)
-    laptops["CPU Frequency"] = laptops["CPU Frequency"].str[:-3]
-    laptops["Ram"] = laptops["Ram"].str[:-2]
-    laptops["Ram"] = laptops["Ram"].astype("int")
-    laptops["CPU Frequency"] = laptops["CPU Frequency"].astype("float")
-    laptops["Screen Width"] = laptops["Screen Width"].astype("int")
-    laptops["Screen Height"] = laptops["Screen Height"].astype("int")
-    laptops["Memory Amount"] = laptops.Memory.str.split(" ").apply(lambda x: x[0])
-    laptops["Memory Type"] = laptops.Memory.str.split(" ").apply(lambda x: x[1])
-    laptops["Memory Amount"] = laptops["Memory Amount"].apply(turn_memory_into_MB)
-    laptops = laptops.drop("Memory", axis=1)
-    laptops["Weight"] = laptops["Weight"].str[:-2]
-    laptops["Weight"] = laptops["Weight"].astype("float")
-    laptops["GPU Brand"] = laptops.Gpu.str.split(" ").apply(lambda x: x[0])
-    laptops = laptops.drop("Gpu", axis=1)
-    laptops = laptops.join(pd.get_dummies(laptops.OpSys))
-    laptops = laptops.drop("OpSys", axis=1)
-    cpu_categories = pd.get_dummies(laptops["CPU Brand"])
-    cpu_categories.columns = [col + "_CPU" for col in cpu_categories.columns]
-    laptops = laptops.join(cpu_categories)
-    laptops = laptops.drop("CPU Brand", axis=1)
-    gpu_categories = pd.get_dummies(laptops["GPU Brand"])
-    gpu_categories.columns = [col + "_GPU" for col in gpu_categories.columns]
-    laptops = laptops.join(gpu_categories)
-    laptops = laptops.drop("GPU Brand", axis=1)
-    target_correlations = laptops.corr(numeric_only=True)["Price_euros"].apply(abs).sort_values()
+    # parse raw string columns into independent series, the frame is assembled once at the end
+    # resolution is the last word: 'IPS Panel Retina Display 2560x1600'
+    resolution = laptops.ScreenResolution.str.rsplit(" ", n=1).str[-1].str.split("x", expand=True)
+    cpu = laptops.Cpu.str.split(" ")
+    memory = laptops.Memory.str.split(" ", n=2, expand=True)
+    parsed = [
+        laptops["Ram"].str[:-2].astype("int").rename("Ram"),
+        laptops["Weight"].str[:-2].astype("float").rename("Weight"),
+        resolution[0].astype("int").rename("Screen Width"),
+        resolution[1].astype("int").rename("Screen Height"),
+        cpu.str[-1].str[:-3].astype("float").rename("CPU Frequency"),
+        turn_memory_into_MB(memory[0]).rename("Memory Amount"),
+        memory[1].rename("Memory Type"),
+    ]
+    categorical = {
+        "Company": laptops.Company,
+        "TypeName": laptops.TypeName,
+        "OpSys": laptops.OpSys,
+        "CPU Brand": cpu.str[0],
+        "GPU Brand": laptops.Gpu.str.split(" ", n=1, expand=True)[0],
+    }
+    # one-hot all categorical columns
+    dummies = [
+        pd.get_dummies(values, dtype=np.uint8).add_suffix(CATEGORICAL_SUFFIXES[col])
+        for col, values in categorical.items()
+    ]
+    # drop returns a new frame, so the passed one is never modified
+    laptops = pd.concat([laptops.drop(RAW_COLUMNS, axis=1), *parsed, *dummies], axis=1, copy=False)
+    target_correlations = target_correlation(laptops, "Price_euros").abs().sort_values()
     logger.info(f"target_correlations: {target_correlations}")
     selected_features = target_correlations[-21:].index
     selected_features = list(selected_features)
     logger.info(f"selected_features: {selected_features}")
-    preprocessed_df = laptops[selected_features]
+    # single precision is enough for scaler and forest, halves memory of the output
+    preprocessed_df = laptops[selected_features].astype(np.float32)
     return preprocessed_df
 
 
@@ -1,6 +1,6 @@
-import pickle
 from argparse import ArgumentParser
 
+import joblib
 import pandas as pd
 from train import train_model
 
@@ -21,6 +21,7 @@ print("\tDone")
 
 # save model
 model_save_as = args.trained_model
-pickle.dump(model, open(model_save_as, "wb"))
+# uncompressed, so predict can memory-map the tree arrays
+joblib.dump(model, model_save_as, compress=0)
 print(f"Model saved as '{model_save_as}'")
 #
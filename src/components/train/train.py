@@ -1,17 +1,17 @@
 import pandas as pd
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 
 
-def train_model(data: pd.DataFrame, test_size: float) -> RandomForestRegressor:
+def train_model(data: pd.DataFrame, test_size: float) -> Pipeline:
     X, y = data.drop("Price_euros", axis=1), data["Price_euros"]
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size)
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
-    forest = RandomForestRegressor()
-    forest.fit(X_train_scaled, y_train)
-    test_score = forest.score(X_test_scaled, y_test)
+    # scaler is fitted on train data and persisted with the forest, so predict applies the same transform
+    model = Pipeline([("scaler", StandardScaler()), ("rf", RandomForestRegressor(n_jobs=-1))])
+    # fitted on arrays: columns are matched by position, as before
+    model.fit(X_train.to_numpy(), y_train)
+    test_score = model.score(X_test.to_numpy(), y_test)
     print(f"\tTest score: {test_score}")
-    return forest
+    return model